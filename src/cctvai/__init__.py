@@ -1,5 +1,20 @@
 """CCTVAI - Behaviour aware video analytics framework."""
+from typing import TYPE_CHECKING
+
 from .config import CCTVAIConfig, default_config
-from .pipeline import CCTVAI
+
+if TYPE_CHECKING:
+    from .pipeline import CCTVAI
+
+
+def __getattr__(name: str):
+    # Imported lazily so that spawned stream workers, which import this package
+    # to unpickle their target, do not load the detection and analytics models.
+    if name == "CCTVAI":
+        from .pipeline import CCTVAI
+
+        return CCTVAI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ["CCTVAI", "CCTVAIConfig", "default_config"]
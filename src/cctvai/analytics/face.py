@@ -2,8 +2,10 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict
+import threading
+from typing import Dict, List, Optional, Sequence
 
+import cv2
 import numpy as np
 
 from ..detectors.base import BoundingBox, FaceAnalytics
@@ -15,26 +17,56 @@ try:  # pragma: no cover - optional dependency
 except Exception:  # pragma: no cover
     DeepFace = None  # type: ignore
 
+EMOTION_LABELS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+GENDER_LABELS = ("Woman", "Man")
+ATTRIBUTE_INPUT_SIZE = (224, 224)
+EMOTION_INPUT_SIZE = (48, 48)
+
+
+def _build_attribute_model(name: str):
+    """Return the underlying Keras model for a DeepFace attribute model.
+
+    DeepFace changed the ``build_model`` signature and started wrapping models in
+    client objects over time, so both shapes of the API are accepted here.
+    """
+
+    try:
+        client = DeepFace.build_model(model_name=name, task="facial_attribute")
+    except TypeError:
+        client = DeepFace.build_model(name)
+    return getattr(client, "model", client)
+
 
 class DeepFaceAnalytics(FaceAnalytics):
-    """Use DeepFace to extract age, gender and emotions."""
+    """Use DeepFace to extract age, gender and emotions.
+
+    Keras does not guarantee concurrent ``predict`` calls on one model are safe,
+    so model calls are serialised with a lock when streams are analysed in
+    parallel.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, detector_backend: str = "retinaface") -> None:
         if DeepFace is None:
             raise RuntimeError(
                 "DeepFace is required for face analytics. Install with `pip install deepface`."
             )
+        self.detector_backend = detector_backend
+        self._age_model = _build_attribute_model("Age")
+        self._gender_model = _build_attribute_model("Gender")
+        self._emotion_model = _build_attribute_model("Emotion")
+        self._lock = threading.Lock()
         LOGGER.info("DeepFace analytics initialised")
 
     def analyze(self, frame: np.ndarray, bbox: BoundingBox) -> Dict[str, object]:
         x1, y1, x2, y2 = map(int, bbox.as_tuple())
         crop = frame[max(y1, 0) : max(y2, 0), max(x1, 0) : max(x2, 0)]
-        analysis = DeepFace.analyze(
-            crop,
-            actions=("age", "gender", "emotion"),
-            enforce_detection=False,
-            detector_backend="retinaface",
-        )
+        with self._lock:
+            analysis = DeepFace.analyze(
+                crop,
+                actions=("age", "gender", "emotion"),
+                enforce_detection=False,
+                detector_backend=self.detector_backend,
+            )
         if isinstance(analysis, list):
             analysis = analysis[0]
         return {
@@ -44,5 +76,74 @@ class DeepFaceAnalytics(FaceAnalytics):
             "emotions": analysis.get("emotion"),
         }
 
+    def _locate_face(self, crop: np.ndarray) -> Optional[np.ndarray]:
+        """Return the most confident face inside a person crop as a BGR float image in [0, 1]."""
+
+        with self._lock:
+            faces = DeepFace.extract_faces(
+                crop,
+                detector_backend=self.detector_backend,
+                enforce_detection=False,
+                align=True,
+            )
+        # With enforce_detection disabled DeepFace returns the whole input with
+        # zero confidence when it finds no face.
+        faces = [face for face in faces if face.get("confidence", 0) > 0]
+        if not faces:
+            return None
+        face = np.asarray(max(faces, key=lambda item: item["confidence"])["face"], dtype=np.float32)
+        if face.size == 0:
+            return None
+        if face.max() > 1.0:
+            face /= 255.0
+        return np.ascontiguousarray(face[:, :, ::-1])
+
+    def analyze_batch(self, frame: np.ndarray, bboxes: Sequence[BoundingBox]) -> List[Dict[str, object]]:
+        """Analyse every person of a frame with one forward pass per attribute model.
+
+        Faces are located inside each person crop with DeepFace's detector, then
+        the face crops are stacked and fed to the age, gender and emotion models
+        together. The result list is aligned with ``bboxes``; persons without a
+        detectable face yield an empty dict.
+        """
+
+        results: List[Dict[str, object]] = [{} for _ in bboxes]
+        crops: List[np.ndarray] = []
+        indices: List[int] = []
+        height, width = frame.shape[:2]
+        for idx, bbox in enumerate(bboxes):
+            x1, y1, x2, y2 = map(int, bbox.as_tuple())
+            crop = frame[max(y1, 0) : min(y2, height), max(x1, 0) : min(x2, width)]
+            if crop.size == 0:
+                continue
+            face = self._locate_face(crop)
+            if face is None:
+                continue
+            crops.append(cv2.resize(face, ATTRIBUTE_INPUT_SIZE))
+            indices.append(idx)
+        if not crops:
+            return results
+
+        batch = np.stack(crops)
+        gray = np.stack(
+            [cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), EMOTION_INPUT_SIZE) for img in batch]
+        )[..., np.newaxis]
+
+        with self._lock:
+            age_probs = np.asarray(self._age_model.predict(batch, verbose=0))
+            gender_probs = np.asarray(self._gender_model.predict(batch, verbose=0))
+            emotion_probs = np.asarray(self._emotion_model.predict(gray, verbose=0))
+
+        ages = age_probs @ np.arange(age_probs.shape[1])
+        for row, idx in enumerate(indices):
+            emotion_scores = 100 * emotion_probs[row] / emotion_probs[row].sum()
+            results[idx] = {
+                "age": int(ages[row]),
+                "gender": GENDER_LABELS[int(np.argmax(gender_probs[row]))],
+                "emotion": EMOTION_LABELS[int(np.argmax(emotion_scores))],
+                "emotions": {label: float(score) for label, score in zip(EMOTION_LABELS, emotion_scores)},
+            }
+        return results
+
 
 __all__ = ["DeepFaceAnalytics"]
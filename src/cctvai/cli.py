@@ -12,7 +12,6 @@ from rich.console import Console
 from rich.table import Table
 
 from .config import CCTVAIConfig, default_config
-from .pipeline import CCTVAI
 from .storage import AlertLog, StreamStat, create_storage
 from .web.app import create_app
 
@@ -22,13 +21,20 @@ console = Console()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 
 
+def read_config_file(config_path: Path) -> dict:
+    """Parse a YAML config, using libyaml's C loader when it is available."""
+
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(config_path.read_text(), Loader=loader) or {}
+
+
 def load_config(config_path: Optional[Path]) -> CCTVAIConfig:
     if config_path is None:
         console.print("[yellow]No config provided. Using defaults.[/yellow]")
         return default_config()
-    import yaml
-
-    data = yaml.safe_load(Path(config_path).read_text())
+    data = read_config_file(Path(config_path))
     # Basic manual mapping to dataclasses for brevity
     cfg = default_config()
     if "streams" in data:
@@ -41,14 +47,27 @@ def load_config(config_path: Optional[Path]) -> CCTVAIConfig:
             )
             for item in data["streams"]
         ]
+        for stream, item in zip(cfg.streams, data["streams"]):
+            if "detect_size" in item:
+                stream.detect_size = tuple(item["detect_size"]) if item["detect_size"] else None
+            stream.use_gpu_preproc = item.get("use_gpu_preproc", stream.use_gpu_preproc)
     if "detection" in data:
         det = data["detection"]
         cfg.detection.person_detector = det.get("person_detector", cfg.detection.person_detector)
         cfg.detection.behaviour_model = det.get("behaviour_model", cfg.detection.behaviour_model)
+        cfg.detection.batch_size = det.get("batch_size", cfg.detection.batch_size)
+        cfg.detection.batch_window_ms = det.get("batch_window_ms", cfg.detection.batch_window_ms)
+        cfg.detection.behaviour_stride = det.get("behaviour_stride", cfg.detection.behaviour_stride)
+        cfg.detection.device = det.get("device", cfg.detection.device)
+        cfg.detection.precision = det.get("precision", cfg.detection.precision)
+        cfg.detection.export_engine = det.get("export_engine", cfg.detection.export_engine)
     if "analytics" in data:
         cfg.analytics.aggregation_interval_seconds = data["analytics"].get(
             "aggregation_interval_seconds", cfg.analytics.aggregation_interval_seconds
         )
+        cfg.analytics.analytics_cooldown_seconds = data["analytics"].get(
+            "analytics_cooldown_seconds", cfg.analytics.analytics_cooldown_seconds
+        )
     if "storage" in data:
         cfg.storage.sqlite_path = Path(data["storage"].get("sqlite_path", cfg.storage.sqlite_path))
     return cfg
@@ -58,6 +77,8 @@ def load_config(config_path: Optional[Path]) -> CCTVAIConfig:
 def run(config: Optional[Path] = typer.Option(None, help="Path to YAML configuration")):
     """Run the CCTVAI processing pipeline."""
 
+    from .pipeline import CCTVAI
+
     cfg = load_config(config)
     engine_factory = create_storage(cfg.storage)
     system = CCTVAI(cfg)
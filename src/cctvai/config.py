@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional, Tuple
 
 
 @dataclass
@@ -15,12 +15,17 @@ class StreamConfig:
         url: OpenCV compatible source (device id, file path, RTSP/HTTP URL).
         enabled: Whether the stream should be processed.
         sampling_rate: Process every Nth frame to reduce load.
+        detect_size: Letterbox frames to this (height, width) while decoding so
+            the detector receives network-sized input. ``None`` keeps raw frames.
+        use_gpu_preproc: Letterbox through OpenCL (``cv2.UMat``) when available.
     """
 
     name: str
     url: str
     enabled: bool = True
     sampling_rate: int = 1
+    detect_size: Optional[Tuple[int, int]] = (640, 640)
+    use_gpu_preproc: bool = False
 
 
 @dataclass
@@ -35,22 +40,44 @@ class BehaviourLabel:
 
 @dataclass
 class DetectionConfig:
-    """Configures the detection modules used in the pipeline."""
+    """Configures the detection modules used in the pipeline.
+
+    Attributes:
+        batch_size: Maximum number of frames sent to the person detector at once.
+        batch_window_ms: How long to wait for more frames before running a partial batch.
+        behaviour_stride: Run the behaviour classifier every Nth frame of a stream.
+        device: Torch device for the models, e.g. ``cuda:0``. ``None`` picks CUDA when available.
+        precision: Person detector precision. Reduced precisions use a TensorRT
+            engine next to the weights when one exists.
+        export_engine: Build that TensorRT engine once if it is missing.
+    """
 
     person_detector: str = "yolov8n.pt"
     face_detector: str = "retinaface"
     behaviour_model: str = "MCG-NJU/videomae-base-finetuned-kinetics"
     behaviour_labels: Dict[str, BehaviourLabel] = field(default_factory=dict)
+    batch_size: int = 8
+    batch_window_ms: int = 20
+    behaviour_stride: int = 8
+    device: Optional[str] = None
+    precision: Literal["fp32", "fp16", "int8"] = "fp16"
+    export_engine: bool = False
 
 
 @dataclass
 class AnalyticsConfig:
-    """Metadata capture options."""
+    """Metadata capture options.
+
+    Attributes:
+        analytics_cooldown_seconds: Minimum time before face analytics is re-run
+            for the same tracked person.
+    """
 
     collect_person_counts: bool = True
     collect_demographics: bool = True
     collect_psychometrics: bool = True
     aggregation_interval_seconds: int = 600
+    analytics_cooldown_seconds: float = 2.0
 
 
 @dataclass
@@ -2,11 +2,23 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Iterable, List, Protocol, Tuple
+from typing import Iterable, List, Optional, Protocol, Sequence, Tuple
 
 import numpy as np
 
 
+def resolve_device(device: Optional[str] = None) -> str:
+    """Return ``device`` or pick CUDA when available, falling back to CPU."""
+
+    if device:
+        return device
+    try:  # pragma: no cover - optional dependency
+        import torch
+    except Exception:  # pragma: no cover
+        return "cpu"
+    return "cuda:0" if torch.cuda.is_available() else "cpu"
+
+
 @dataclass
 class BoundingBox:
     """Axis-aligned bounding box."""
@@ -43,6 +55,13 @@ class PersonDetector(Protocol):
     def detect(self, frame: np.ndarray) -> List[Detection]:
         ...
 
+    def detect_batch(
+        self,
+        frames: List[np.ndarray],
+        orig_shapes: Optional[Sequence[Optional[Tuple[int, int]]]] = None,
+    ) -> List[List[Detection]]:
+        ...
+
 
 class FaceAnalytics(Protocol):
     """Extract age/gender/emotion data from a face crop."""
@@ -50,6 +69,9 @@ class FaceAnalytics(Protocol):
     def analyze(self, frame: np.ndarray, bbox: BoundingBox) -> dict:
         ...
 
+    def analyze_batch(self, frame: np.ndarray, bboxes: List[BoundingBox]) -> List[dict]:
+        ...
+
 
 class BehaviourClassifier(Protocol):
     """Classify short video clips."""
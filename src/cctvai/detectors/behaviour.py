@@ -2,50 +2,162 @@
 from __future__ import annotations
 
 import logging
-from collections import deque
-from typing import Deque, List, Tuple
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
 
+import cv2
 import numpy as np
 
 try:  # pragma: no cover - optional dependency
-    from transformers import pipeline
+    import torch
+    from transformers import AutoImageProcessor, AutoModelForVideoClassification
 except Exception:  # pragma: no cover
-    pipeline = None  # type: ignore
+    torch = None  # type: ignore
+    AutoImageProcessor = AutoModelForVideoClassification = None  # type: ignore
 
-from .base import BehaviourClassifier
+from .base import BehaviourClassifier, resolve_device
 
 LOGGER = logging.getLogger(__name__)
 
+UNKNOWN_RESULT: Tuple[str, float] = ("unknown", 0.0)
+
+
+@dataclass
+class _ClipBuffer:
+    """Preallocated ring of frames and cached result for a single stream.
+
+    ``ring`` has shape ``(window, H, W, 3)``; frame ``n`` is written to slot
+    ``n % window`` so no per-frame allocation or per-window stacking is needed.
+    ``staging`` receives the rotated window when the ring is not in order.
+    """
+
+    ring: np.ndarray
+    staging: np.ndarray
+    write_idx: int = 0
+    since_last: int = 0
+    last_result: Tuple[str, float] = field(default=UNKNOWN_RESULT)
+
+    def clip(self) -> np.ndarray:
+        """Return the buffered frames oldest first."""
+
+        start = self.write_idx % len(self.ring)
+        if start == 0:
+            return self.ring
+        return np.concatenate((self.ring[start:], self.ring[:start]), out=self.staging)
+
 
 class VideoBehaviourClassifier(BehaviourClassifier):
-    """Wrap a HuggingFace video classification pipeline."""
+    """Run a HuggingFace video classification model (e.g. VideoMAE) directly.
+
+    The model is called without the ``transformers`` pipeline wrapper: frames are
+    already resized when buffered, so preprocessing is reduced to a rescale and
+    normalisation on the target device. On CUDA the model runs in fp16.
+    """
 
-    def __init__(self, model_name: str, window: int = 16) -> None:
-        if pipeline is None:
+    def __init__(
+        self,
+        model_name: str,
+        window: int = 16,
+        stride: int = 8,
+        device: str | None = None,
+        compile_model: bool = False,
+        warmup: bool = True,
+    ) -> None:
+        if AutoModelForVideoClassification is None:
             raise RuntimeError(
                 "transformers is required for behaviour classification. Install with `pip install transformers torch`."
             )
-        self._pipeline = pipeline("video-classification", model=model_name)
+        self.device = resolve_device(device)
+        self.dtype = torch.float16 if self.device.startswith("cuda") else torch.float32
+        processor = AutoImageProcessor.from_pretrained(model_name)
+        model = AutoModelForVideoClassification.from_pretrained(model_name, torch_dtype=self.dtype)
+        self._model = model.to(self.device).eval()
+        if compile_model:
+            self._model = torch.compile(self._model, mode="reduce-overhead")
+        self._labels = model.config.id2label
+        crop_size = getattr(processor, "crop_size", None) or {"height": 224}
+        self.frame_size = int(crop_size["height"])
+        self._mean = torch.tensor(processor.image_mean, device=self.device, dtype=self.dtype).view(1, 1, 3, 1, 1)
+        self._std = torch.tensor(processor.image_std, device=self.device, dtype=self.dtype).view(1, 1, 3, 1, 1)
         self.window = window
-        self._buffer: Deque[np.ndarray] = deque(maxlen=window)
-        LOGGER.info("Loaded behaviour classifier %s", model_name)
+        self.stride = max(stride, 1)
+        self._buffers: Dict[str, _ClipBuffer] = {}
+        self._lock = threading.Lock()
+        LOGGER.info("Loaded behaviour classifier %s on %s", model_name, self.device)
+        if warmup:
+            self.warmup()
+
+    def warmup(self) -> None:
+        """Run one random clip through the model so the first real window is not stalled."""
+
+        pixel_values = torch.randn(
+            1, self.window, 3, self.frame_size, self.frame_size, device=self.device, dtype=self.dtype
+        )
+        with self._lock, torch.inference_mode():
+            self._model(pixel_values=pixel_values)
+
+    def update(self, frame: np.ndarray, stream: str = "default") -> Tuple[str, float]:
+        """Append a frame to the window of ``stream`` and classify it every ``stride`` frames.
 
-    def update(self, frame: np.ndarray) -> Tuple[str, float]:
-        self._buffer.append(frame)
-        if len(self._buffer) < self.window:
-            return ("unknown", 0.0)
-        return self.predict(list(self._buffer))
+        Between inference runs the last result of the stream is returned.
+        """
+
+        buffer = self._buffers.get(stream)
+        if buffer is None:
+            buffer = self._buffers[stream] = _ClipBuffer(
+                ring=self._empty_clip(self.window), staging=self._empty_clip(self.window)
+            )
+        self._prepare(frame, out=buffer.ring[buffer.write_idx % self.window])
+        buffer.write_idx += 1
+        buffer.since_last += 1
+        if buffer.write_idx < self.window or buffer.since_last < self.stride:
+            return buffer.last_result
+        buffer.since_last = 0
+        buffer.last_result = self._classify(buffer.clip())
+        return buffer.last_result
+
+    def _empty_clip(self, length: int) -> np.ndarray:
+        """Allocate a ``(length, S, S, 3)`` uint8 clip, page-locked on CUDA for async copies."""
+
+        shape = (length, self.frame_size, self.frame_size, 3)
+        if self.device.startswith("cuda"):
+            return torch.empty(shape, dtype=torch.uint8, pin_memory=True).numpy()
+        return np.empty(shape, dtype=np.uint8)
+
+    def _prepare(self, frame: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """Resize to the model input size and convert OpenCV BGR to RGB into ``out``."""
+
+        resized = cv2.resize(frame, (self.frame_size, self.frame_size), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=out)
 
     def predict(self, frames: List[np.ndarray]) -> Tuple[str, float]:
         if len(frames) < self.window:
             raise ValueError("Not enough frames provided")
-        video = np.stack(frames, axis=0)
-        outputs = self._pipeline(video)
-        if isinstance(outputs, list):
-            outputs = outputs[0]
-        label = outputs[0]["label"]
-        score = float(outputs[0]["score"])
-        return (label, score)
+        video = np.empty((len(frames), self.frame_size, self.frame_size, 3), dtype=np.uint8)
+        for index, frame in enumerate(frames):
+            self._prepare(frame, out=video[index])
+        return self._classify(video)
+
+    def _classify(self, video: np.ndarray) -> Tuple[str, float]:
+        pixel_values = self._to_tensor(video)
+        with self._lock, torch.inference_mode():
+            logits = self._model(pixel_values=pixel_values).logits
+        probs = logits[0].float().softmax(-1)
+        score, index = probs.max(-1)
+        return (self._labels[int(index)], float(score))
+
+    def _to_tensor(self, video: np.ndarray) -> "torch.Tensor":
+        """Convert a ``(T, H, W, 3)`` uint8 RGB clip to normalised ``(1, T, 3, H, W)`` pixel values.
+
+        The copy is asynchronous when ``video`` lives in pinned memory; reading the
+        result in ``_classify`` synchronises before the buffer is written again.
+        """
+
+        tensor = torch.from_numpy(video)
+        tensor = tensor.to(self.device, non_blocking=tensor.is_pinned()).permute(0, 3, 1, 2).unsqueeze(0)
+        tensor = tensor.to(self.dtype) / 255.0
+        return (tensor - self._mean) / self._std
 
 
 __all__ = ["VideoBehaviourClassifier"]
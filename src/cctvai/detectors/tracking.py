@@ -0,0 +1,83 @@
+"""Lightweight IoU based tracker."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Set
+
+import numpy as np
+
+from .base import BoundingBox, Detection
+
+
+@dataclass
+class _Track:
+    bbox: BoundingBox
+    missed: int = 0
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between ``(N, 4)`` and ``(M, 4)`` xyxy boxes."""
+
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class IoUTracker:
+    """Assign stable ids to detections by greedily matching boxes across frames.
+
+    A track survives up to ``max_missed`` frames without a matching detection.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 15) -> None:
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self._tracks: Dict[int, _Track] = {}
+        self._next_id = 1
+
+    @property
+    def active_ids(self) -> Set[int]:
+        return set(self._tracks)
+
+    def update(self, detections: Sequence[Detection]) -> List[int]:
+        """Match ``detections`` to tracks and return their ids in the same order."""
+
+        track_ids = list(self._tracks)
+        assigned: List[int] = [0] * len(detections)
+        matched_tracks: Set[int] = set()
+        if track_ids and detections:
+            previous = np.array([self._tracks[tid].bbox.as_tuple() for tid in track_ids], dtype=np.float32)
+            current = np.array([det.bbox.as_tuple() for det in detections], dtype=np.float32)
+            ious = iou_matrix(previous, current)
+            for flat in np.argsort(ious, axis=None)[::-1]:
+                row, col = divmod(int(flat), len(detections))
+                if ious[row, col] < self.iou_threshold:
+                    break
+                if assigned[col] or track_ids[row] in matched_tracks:
+                    continue
+                assigned[col] = track_ids[row]
+                matched_tracks.add(track_ids[row])
+
+        for idx, detection in enumerate(detections):
+            if not assigned[idx]:
+                assigned[idx] = self._next_id
+                self._next_id += 1
+            self._tracks[assigned[idx]] = _Track(bbox=detection.bbox)
+
+        for tid in track_ids:
+            if tid in matched_tracks:
+                continue
+            track = self._tracks[tid]
+            track.missed += 1
+            if track.missed > self.max_missed:
+                del self._tracks[tid]
+        return assigned
+
+
+__all__ = ["IoUTracker", "iou_matrix"]
@@ -3,7 +3,8 @@ from __future__ import annotations
 
 import logging
 from functools import lru_cache
-from typing import List
+from pathlib import Path
+from typing import List, Literal, Optional, Sequence, Tuple
 
 import numpy as np
 
@@ -12,49 +13,154 @@ try:
 except Exception:  # pragma: no cover - optional dependency
     YOLO = None  # type: ignore
 
-from .base import BoundingBox, Detection, PersonDetector
+from ..imaging import scale_boxes
+from .base import BoundingBox, Detection, PersonDetector, resolve_device
 
 LOGGER = logging.getLogger(__name__)
 
+Precision = Literal["fp32", "fp16", "int8"]
+INT8_CALIBRATION_DATA = "coco128.yaml"
+
+
+def _export_engine(weights: str, device: str, precision: Precision, batch_size: int, imgsz: int) -> Optional[str]:
+    """Export ``weights`` to a TensorRT engine next to the weights file."""
+
+    options = {
+        "format": "engine",
+        "device": device,
+        "half": precision == "fp16",
+        "int8": precision == "int8",
+        "dynamic": True,
+        "batch": batch_size,
+        "imgsz": imgsz,
+    }
+    if precision == "int8":
+        options["data"] = INT8_CALIBRATION_DATA
+    LOGGER.info("Exporting %s to TensorRT (%s)", weights, precision)
+    try:
+        return str(YOLO(weights).export(**options))
+    except Exception as exc:  # pragma: no cover - TensorRT optional
+        LOGGER.warning("TensorRT export failed, using %s: %s", weights, exc)
+        return None
+
 
 @lru_cache(maxsize=2)
-def _load_model(weights: str) -> YOLO:
+def _load_model(
+    weights: str,
+    device: str = "cpu",
+    precision: Precision = "fp32",
+    batch_size: int = 1,
+    imgsz: int = 640,
+    export_engine: bool = False,
+) -> YOLO:
+    """Load YOLO weights, preferring a TensorRT engine on CUDA.
+
+    ``.engine`` weights are loaded as is. Otherwise an engine sibling of the
+    weights file is used when present, or built once when ``export_engine`` is
+    set and a reduced precision was requested.
+    """
+
     if YOLO is None:
         raise RuntimeError(
             "Ultralytics YOLO is not installed. Install with `pip install ultralytics`."
         )
+    path = Path(weights)
+    if path.suffix != ".engine" and device.startswith("cuda") and precision != "fp32":
+        engine = path.with_suffix(".engine")
+        if engine.exists():
+            weights = str(engine)
+        elif export_engine:
+            weights = _export_engine(weights, device, precision, batch_size, imgsz) or weights
+    if not weights.endswith(".engine"):
+        if precision == "int8":
+            LOGGER.warning("int8 needs a TensorRT engine on CUDA; %s runs in fp32", weights)
+        elif precision == "fp16" and device.startswith("cuda"):
+            LOGGER.info("No TensorRT engine for %s; running fp16 through PyTorch", weights)
+        elif precision == "fp16":
+            # fp16 is the default precision, so this is the normal CPU-only setup.
+            LOGGER.info("%s runs in fp32 on CPU", weights)
     LOGGER.info("Loading YOLO weights %s", weights)
+    if weights.endswith(".engine"):
+        return YOLO(weights, task="detect")
     return YOLO(weights)
 
 
 class YoloPersonDetector(PersonDetector):
     """Detect persons using YOLOv8 models."""
 
-    def __init__(self, weights: str = "yolov8n.pt", confidence: float = 0.35) -> None:
+    def __init__(
+        self,
+        weights: str = "yolov8n.pt",
+        confidence: float = 0.35,
+        imgsz: int = 640,
+        device: Optional[str] = None,
+        precision: Precision = "fp16",
+        batch_size: int = 1,
+        export_engine: bool = False,
+        warmup: bool = True,
+    ) -> None:
         self.weights = weights
         self.confidence = confidence
-        self._model = _load_model(weights)
-
-    def detect(self, frame: np.ndarray) -> List[Detection]:
-        results = self._model.predict(frame, conf=self.confidence, classes=[0])
-        detections: List[Detection] = []
-        for result in results:
-            for box in result.boxes:
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                conf = float(box.conf[0])
-                detections.append(
-                    Detection(
-                        bbox=BoundingBox(
-                            x1=float(x1),
-                            y1=float(y1),
-                            x2=float(x2),
-                            y2=float(y2),
-                            confidence=conf,
-                            label="person",
-                        )
-                    )
-                )
-        return detections
+        self.imgsz = imgsz
+        self.device = resolve_device(device)
+        self.precision = precision
+        self.batch_size = max(batch_size, 1)
+        self._model = _load_model(weights, self.device, precision, self.batch_size, imgsz, export_engine)
+        self._half = precision == "fp16" and self.device.startswith("cuda")
+        if warmup:
+            self.warmup()
+
+    def warmup(self) -> None:
+        """Run one blank batch so kernel selection happens before the first real frame."""
+
+        blank = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        self.detect_batch([blank] * self.batch_size)
+        LOGGER.info("Warmed up YOLO with batch size %d", self.batch_size)
+
+    def detect(self, frame: np.ndarray, orig_shape: Optional[Tuple[int, int]] = None) -> List[Detection]:
+        return self.detect_batch([frame], [orig_shape])[0]
+
+    def detect_batch(
+        self,
+        frames: List[np.ndarray],
+        orig_shapes: Optional[Sequence[Optional[Tuple[int, int]]]] = None,
+    ) -> List[List[Detection]]:
+        """Run a single inference call over several frames.
+
+        Ultralytics accepts a list of images and returns one result per image, so
+        the returned list is aligned with ``frames``. Frames that were letterboxed
+        upstream pass their decoded ``orig_shape`` so boxes are mapped back to it.
+        """
+
+        if not frames:
+            return []
+        if orig_shapes is None:
+            orig_shapes = [None] * len(frames)
+        results = self._model.predict(
+            frames,
+            conf=self.confidence,
+            classes=[0],
+            imgsz=self.imgsz,
+            device=self.device,
+            half=self._half,
+            verbose=False,
+        )
+        return [self._parse_result(result, orig_shape) for result, orig_shape in zip(results, orig_shapes)]
+
+    @staticmethod
+    def _parse_result(result, orig_shape: Optional[Tuple[int, int]] = None) -> List[Detection]:
+        # Copy all boxes to the host at once instead of syncing per box.
+        boxes = result.boxes.xyxy.cpu().numpy()
+        if not len(boxes):
+            return []
+        confidences = result.boxes.conf.cpu().numpy().tolist()
+        input_shape = tuple(result.orig_shape)
+        if orig_shape is not None and tuple(orig_shape) != input_shape:
+            boxes = scale_boxes(boxes, input_shape, orig_shape)
+        return [
+            Detection(bbox=BoundingBox(x1=x1, y1=y1, x2=x2, y2=y2, confidence=conf, label="person"))
+            for (x1, y1, x2, y2), conf in zip(boxes.tolist(), confidences)
+        ]
 
 
 __all__ = ["YoloPersonDetector"]
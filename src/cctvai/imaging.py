@@ -0,0 +1,56 @@
+"""Image helpers shared by the stream readers and detectors."""
+from __future__ import annotations
+
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+def letterbox(
+    image: np.ndarray,
+    new_shape: Tuple[int, int] = (640, 640),
+    color: Tuple[int, int, int] = LETTERBOX_COLOR,
+    use_opencl: bool = False,
+) -> np.ndarray:
+    """Resize ``image`` to ``new_shape`` (height, width) keeping its aspect ratio.
+
+    The remaining border is padded with ``color``, mirroring the Ultralytics
+    letterbox so that YOLO does not need to resize the frame again. With
+    ``use_opencl`` the resize and padding run through OpenCV's transparent API
+    (``cv2.UMat``) and only the letterboxed result is copied back.
+    """
+
+    shape = image.shape[:2]
+    if use_opencl:
+        image = cv2.UMat(image)
+    ratio = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+    new_unpad = (int(round(shape[1] * ratio)), int(round(shape[0] * ratio)))
+    pad_w = (new_shape[1] - new_unpad[0]) / 2
+    pad_h = (new_shape[0] - new_unpad[1]) / 2
+    if (shape[1], shape[0]) != new_unpad:
+        image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    result = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return result.get() if use_opencl else result
+
+
+def scale_boxes(boxes: np.ndarray, img_shape: Tuple[int, int], orig_shape: Tuple[int, int]) -> np.ndarray:
+    """Map ``(N, 4)`` xyxy boxes from a letterboxed image back to the original frame."""
+
+    gain = min(img_shape[0] / orig_shape[0], img_shape[1] / orig_shape[1])
+    pad_w = round((img_shape[1] - orig_shape[1] * gain) / 2 - 0.1)
+    pad_h = round((img_shape[0] - orig_shape[0] * gain) / 2 - 0.1)
+    boxes = np.asarray(boxes, dtype=np.float32).copy()
+    boxes[:, [0, 2]] -= pad_w
+    boxes[:, [1, 3]] -= pad_h
+    boxes /= gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, orig_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, orig_shape[0])
+    return boxes
+
+
+__all__ = ["letterbox", "scale_boxes"]
@@ -1,26 +1,36 @@
 """Core CCTVAI processing pipeline."""
 from __future__ import annotations
 
-import collections
 import datetime as dt
 import logging
 import threading
 from dataclasses import dataclass, field
-from typing import Dict, Iterable, List, Optional
+from queue import Queue
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
 
-from .analytics.face import DeepFaceAnalytics
+from .analytics.face import EMOTION_LABELS, DeepFaceAnalytics
 from .config import CCTVAIConfig, StreamConfig
 from .detectors.behaviour import VideoBehaviourClassifier
 from .detectors.base import BoundingBox, Detection
+from .detectors.tracking import IoUTracker
 from .detectors.yolo import YoloPersonDetector
-from .storage import create_storage, record_alert, record_stat
+from .storage import StorageWriter, create_storage, record_alert, record_stat
 from .streaming.manager import Frame, StreamManager
+from .workers import AnalyticsWorker, DetectWorker
 
 LOGGER = logging.getLogger(__name__)
 
+STAGE_QUEUE_SIZE = 8
+# Re-run face analytics on a track whose box area changed by more than this fraction.
+REANALYZE_AREA_CHANGE = 0.5
+
+GENDER_UNKNOWN, GENDER_MALE, GENDER_FEMALE = 0, 1, 2
+GENDER_CODES = {"Man": GENDER_MALE, "Male": GENDER_MALE, "Woman": GENDER_FEMALE, "Female": GENDER_FEMALE}
+EMOTION_CODES = {label: code for code, label in enumerate(EMOTION_LABELS)}
+
 
 @dataclass
 class PersonObservation:
@@ -31,6 +41,65 @@ class PersonObservation:
     emotions: Dict[str, float] = field(default_factory=dict)
     last_event: Optional[str] = None
     last_event_confidence: float = 0.0
+    track_id: Optional[int] = None
+    last_analyzed: Optional[dt.datetime] = None
+
+    def area(self) -> float:
+        return max(self.bbox.x2 - self.bbox.x1, 0.0) * max(self.bbox.y2 - self.bbox.y1, 0.0)
+
+
+@dataclass
+class PersonObservationArray:
+    """Struct-of-arrays view of observations used for aggregation.
+
+    Unknown values are encoded as ``-1`` for ages and emotions and as
+    ``GENDER_UNKNOWN`` for genders.
+    """
+
+    ages: np.ndarray
+    genders: np.ndarray
+    emotions: np.ndarray
+
+    @classmethod
+    def from_observations(cls, observations: Sequence[PersonObservation]) -> "PersonObservationArray":
+        return cls(
+            ages=np.fromiter(
+                (obs.age if obs.age is not None else -1 for obs in observations),
+                dtype=np.int32,
+                count=len(observations),
+            ),
+            genders=np.fromiter(
+                (GENDER_CODES.get(obs.gender, GENDER_UNKNOWN) for obs in observations),
+                dtype=np.int8,
+                count=len(observations),
+            ),
+            emotions=np.fromiter(
+                (EMOTION_CODES.get(obs.emotion, -1) for obs in observations),
+                dtype=np.int8,
+                count=len(observations),
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ages)
+
+
+def aggregate(ages: np.ndarray, genders: np.ndarray, emotions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the age-decade, gender and emotion histograms of the given codes."""
+
+    age_histogram = np.bincount(ages[ages >= 0] // 10)
+    gender_histogram = np.bincount(genders, minlength=3)
+    emotion_histogram = np.bincount(emotions[emotions >= 0], minlength=len(EMOTION_LABELS))
+    return age_histogram, gender_histogram, emotion_histogram
+
+
+def histogram_to_dict(histogram: np.ndarray, label: Callable[[int], str]) -> Optional[Dict[str, int]]:
+    """Map the non-empty bins of ``histogram`` to ``{label(bin): count}``, or ``None`` if all are empty."""
+
+    bins = np.flatnonzero(histogram)
+    if not bins.size:
+        return None
+    return {label(index): count for index, count in zip(bins.tolist(), histogram[bins].tolist())}
 
 
 @dataclass
@@ -39,6 +108,8 @@ class StreamState:
     persons: List[PersonObservation] = field(default_factory=list)
     last_stat_flush: dt.datetime = field(default_factory=dt.datetime.utcnow)
     active_alerts: Dict[str, dt.datetime] = field(default_factory=dict)
+    tracker: IoUTracker = field(default_factory=IoUTracker)
+    track_cache: Dict[int, PersonObservation] = field(default_factory=dict)
 
 
 class CCTVAI:
@@ -46,57 +117,87 @@ class CCTVAI:
 
     def __init__(self, config: CCTVAIConfig) -> None:
         self.config = config
-        self.person_detector = YoloPersonDetector(config.detection.person_detector)
-        self.face_analytics = DeepFaceAnalytics() if config.analytics.collect_demographics else None
-        self.behaviour_classifier = VideoBehaviourClassifier(config.detection.behaviour_model)
-        self.stream_manager = StreamManager(config.streams)
+        self.person_detector = YoloPersonDetector(
+            config.detection.person_detector,
+            device=config.detection.device,
+            precision=config.detection.precision,
+            batch_size=config.detection.batch_size,
+            export_engine=config.detection.export_engine,
+        )
+        self.face_analytics = (
+            DeepFaceAnalytics(config.detection.face_detector) if config.analytics.collect_demographics else None
+        )
+        self.behaviour_classifier = VideoBehaviourClassifier(
+            config.detection.behaviour_model,
+            stride=config.detection.behaviour_stride,
+            device=config.detection.device,
+        )
+        self.stream_manager = StreamManager(config.streams, keep_full_frames=self.face_analytics is not None)
         self.storage = create_storage(config.storage)
         self.states: Dict[str, StreamState] = {s.name: StreamState(stream=s) for s in config.streams}
         self._stop_event = threading.Event()
+        self.storage_writer = StorageWriter(self.storage)
 
     def start(self) -> None:
         LOGGER.info("Starting CCTVAI")
+        detection_cfg = self.config.detection
+        detect_queue: Queue = Queue(maxsize=STAGE_QUEUE_SIZE)
+        detect_worker = DetectWorker(
+            self.stream_manager,
+            self.person_detector,
+            outbox=detect_queue,
+            batch_size=detection_cfg.batch_size,
+            batch_window=detection_cfg.batch_window_ms / 1000.0,
+        )
+        analytics_worker = AnalyticsWorker(
+            detect_queue,
+            handler=self._process_frame,
+            max_workers=len(self.stream_manager.streams),
+        )
+        self.storage_writer.start()
+        analytics_worker.start()
+        detect_worker.start()
         self.stream_manager.start()
         try:
-            for frame in self.stream_manager.frames():
-                if self._stop_event.is_set():
-                    break
-                self._process_frame(frame)
+            while not self._stop_event.wait(timeout=0.5):
+                pass
         finally:
+            # Stop producing first, then wait for detect and analytics to drain
+            # while the shared memory rings are still mapped. Only then tear the
+            # rings down and flush the rows the stages recorded.
+            self.stream_manager.stop_event.set()
+            detect_worker.stop()
+            analytics_worker.stop()
             self.stream_manager.stop()
+            self.storage_writer.stop()
 
     def stop(self) -> None:
         self._stop_event.set()
 
-    def _process_frame(self, frame: Frame) -> None:
+    def _process_frame(self, frame: Frame, detections: List[Detection]) -> None:
         LOGGER.debug("Processing frame %s:%d", frame.stream.name, frame.frame_id)
-        detections = self.person_detector.detect(frame.data)
-        observations: List[PersonObservation] = []
-        for detection in detections:
-            obs = PersonObservation(bbox=detection.bbox)
-            if self.face_analytics:
-                try:
-                    face_data = self.face_analytics.analyze(frame.data, detection.bbox)
-                    obs.age = face_data.get("age")
-                    obs.gender = face_data.get("gender")
-                    obs.emotion = face_data.get("emotion")
-                    obs.emotions = face_data.get("emotions", {})
-                except Exception as exc:  # pragma: no cover - analytics optional
-                    LOGGER.exception("Face analytics failed: %s", exc)
-            label, confidence = self.behaviour_classifier.update(frame.data)
-            obs.last_event = label
-            obs.last_event_confidence = confidence
+        state = self.states[frame.stream.name]
+        track_ids = state.tracker.update(detections)
+        observations = [
+            PersonObservation(bbox=detection.bbox, track_id=track_id)
+            for detection, track_id in zip(detections, track_ids)
+        ]
+        if self.face_analytics:
+            self._analyze_faces(frame, state, observations)
+        if observations:
+            label, confidence = self.behaviour_classifier.update(frame.data, stream=frame.stream.name)
+            for obs in observations:
+                obs.last_event = label
+                obs.last_event_confidence = confidence
             if label in self.config.detection.behaviour_labels and confidence > 0.6:
                 record_alert(
-                    self.storage,
+                    self.storage_writer,
                     stream_name=frame.stream.name,
                     event_type=label,
                     confidence=confidence,
                     message=f"Detected {label} with confidence {confidence:.2f}",
                 )
-                self.states[frame.stream.name].active_alerts[label] = dt.datetime.utcnow()
-            observations.append(obs)
-        state = self.states[frame.stream.name]
+                state.active_alerts[label] = dt.datetime.utcnow()
         state.persons = observations
         now = dt.datetime.utcnow()
         elapsed = (now - state.last_stat_flush).total_seconds()
@@ -104,24 +205,60 @@ class CCTVAI:
             self._flush_stats(frame.stream, state)
             state.last_stat_flush = now
 
+    def _analyze_faces(self, frame: Frame, state: StreamState, observations: List[PersonObservation]) -> None:
+        """Run face analytics only for new, stale or resized tracks.
+
+        Other tracks reuse the attributes cached from their last analysis.
+        """
+
+        now = dt.datetime.utcnow()
+        cooldown = dt.timedelta(seconds=self.config.analytics.analytics_cooldown_seconds)
+        pending: List[PersonObservation] = []
+        for obs in observations:
+            cached = state.track_cache.get(obs.track_id)
+            if (
+                cached is None
+                or now - cached.last_analyzed >= cooldown
+                or abs(obs.area() - cached.area()) > REANALYZE_AREA_CHANGE * max(cached.area(), 1.0)
+            ):
+                pending.append(obs)
+                continue
+            obs.age = cached.age
+            obs.gender = cached.gender
+            obs.emotion = cached.emotion
+            obs.emotions = cached.emotions
+            obs.last_analyzed = cached.last_analyzed
+        if pending:
+            try:
+                face_results = self.face_analytics.analyze_batch(frame.original, [obs.bbox for obs in pending])
+                for obs, face_data in zip(pending, face_results):
+                    obs.age = face_data.get("age")
+                    obs.gender = face_data.get("gender")
+                    obs.emotion = face_data.get("emotion")
+                    obs.emotions = face_data.get("emotions", {})
+                    obs.last_analyzed = now
+                    state.track_cache[obs.track_id] = obs
+            except Exception as exc:  # pragma: no cover - analytics optional
+                LOGGER.exception("Face analytics failed: %s", exc)
+        active = state.tracker.active_ids
+        for track_id in [tid for tid in state.track_cache if tid not in active]:
+            del state.track_cache[track_id]
+
     def _flush_stats(self, stream: StreamConfig, state: StreamState) -> None:
         LOGGER.info("Flushing stats for %s", stream.name)
-        person_count = len(state.persons)
-        gender_counts = collections.Counter(obs.gender for obs in state.persons if obs.gender)
-        emotion_counts = collections.Counter(obs.emotion for obs in state.persons if obs.emotion)
-        age_histogram: Dict[str, int] = collections.Counter()
-        for obs in state.persons:
-            if obs.age is not None:
-                bucket = f"{(obs.age // 10) * 10}s"
-                age_histogram[bucket] += 1
+        persons = PersonObservationArray.from_observations(state.persons)
+        age_histogram, gender_histogram, emotion_histogram = aggregate(
+            persons.ages, persons.genders, persons.emotions
+        )
+        _, male_count, female_count = gender_histogram.tolist()
         record_stat(
-            self.storage,
+            self.storage_writer,
             stream_name=stream.name,
-            person_count=person_count,
-            male_count=gender_counts.get("Man") or gender_counts.get("Male"),
-            female_count=gender_counts.get("Woman") or gender_counts.get("Female"),
-            age_distribution=dict(age_histogram) if age_histogram else None,
-            emotion_distribution=dict(emotion_counts) if emotion_counts else None,
+            person_count=len(persons),
+            male_count=male_count or None,
+            female_count=female_count or None,
+            age_distribution=histogram_to_dict(age_histogram, lambda bucket: f"{bucket * 10}s"),
+            emotion_distribution=histogram_to_dict(emotion_histogram, EMOTION_LABELS.__getitem__),
             notes=None,
         )
 
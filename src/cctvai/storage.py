@@ -3,16 +3,37 @@ from __future__ import annotations
 
 import datetime as dt
 import logging
+import threading
+import time
 from pathlib import Path
-from typing import Iterable, List, Optional
+from queue import Empty, Queue
+from typing import Dict, Iterable, List, Optional, Tuple, Type
 
-from sqlalchemy import Column, DateTime, Float, Integer, JSON, String, create_engine
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    JSON,
+    String,
+    UniqueConstraint,
+    create_engine,
+    desc,
+    event,
+    insert,
+    inspect,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
 
 from .config import StorageConfig
 
 LOGGER = logging.getLogger(__name__)
 
+# Single-column indexes superseded by the (stream_name, time) composite indexes.
+_REDUNDANT_INDEXES = ("ix_stream_stats_stream_name", "ix_alerts_stream_name")
+
 
 class Base(DeclarativeBase):
     pass
@@ -20,10 +41,11 @@ class Base(DeclarativeBase):
 
 class StreamStat(Base):
     __tablename__ = "stream_stats"
+    __table_args__ = (Index("ix_stat_stream_time", "stream_name", desc("captured_at")),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    stream_name: Mapped[str] = mapped_column(String, index=True)
-    captured_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
+    stream_name: Mapped[str] = mapped_column(String)
+    captured_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow, index=True)
     person_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     male_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     female_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -34,28 +56,258 @@ class StreamStat(Base):
 
 class AlertLog(Base):
     __tablename__ = "alerts"
+    __table_args__ = (Index("ix_alert_stream_time", "stream_name", desc("created_at")),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    stream_name: Mapped[str] = mapped_column(String, index=True)
+    stream_name: Mapped[str] = mapped_column(String)
     event_type: Mapped[str] = mapped_column(String)
     confidence: Mapped[float] = mapped_column(Float)
     message: Mapped[str] = mapped_column(String)
-    created_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow, index=True)
+
+
+class StreamStatHourly(Base):
+    """Hourly rollup of ``StreamStat`` rows, maintained by ``StorageWriter``."""
+
+    __tablename__ = "mv_hourly_stats"
+    __table_args__ = (UniqueConstraint("stream_name", "hour_bucket", name="uq_hourly_stream_hour"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    stream_name: Mapped[str] = mapped_column(String)
+    hour_bucket: Mapped[dt.datetime] = mapped_column(DateTime, index=True)
+    sample_count: Mapped[int] = mapped_column(Integer, default=0)
+    person_count_sum: Mapped[int] = mapped_column(Integer, default=0)
+    male_sum: Mapped[int] = mapped_column(Integer, default=0)
+    female_sum: Mapped[int] = mapped_column(Integer, default=0)
+    # Samples in which each counter was known; the averages ignore the others.
+    person_count_samples: Mapped[int] = mapped_column(Integer, default=0)
+    male_samples: Mapped[int] = mapped_column(Integer, default=0)
+    female_samples: Mapped[int] = mapped_column(Integer, default=0)
+    age_distribution: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    emotion_distribution: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+
+
+# StreamStat counter -> (sum column, known-sample column) in StreamStatHourly.
+_ROLLUP_COUNTERS = {
+    "person_count": ("person_count_sum", "person_count_samples"),
+    "male_count": ("male_sum", "male_samples"),
+    "female_count": ("female_sum", "female_samples"),
+}
+
+
+def _merge_counts(target: Optional[dict], counts: Optional[dict]) -> Optional[dict]:
+    if not counts:
+        return target
+    merged = dict(target or {})
+    for key, value in counts.items():
+        merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _rollup_stats(session, rows: List[dict]) -> None:
+    """Fold raw stat rows into ``StreamStatHourly``.
+
+    Counters are summed by the upsert itself; the JSON histograms are merged
+    with the stored ones here, which is safe because only the writer thread
+    touches the rollup.
+    """
+
+    buckets: Dict[Tuple[str, dt.datetime], dict] = {}
+    for row in rows:
+        hour = row["captured_at"].replace(minute=0, second=0, microsecond=0)
+        bucket = buckets.setdefault(
+            (row["stream_name"], hour),
+            {
+                "stream_name": row["stream_name"],
+                "hour_bucket": hour,
+                "sample_count": 0,
+                "person_count_sum": 0,
+                "male_sum": 0,
+                "female_sum": 0,
+                "person_count_samples": 0,
+                "male_samples": 0,
+                "female_samples": 0,
+                "age_distribution": None,
+                "emotion_distribution": None,
+            },
+        )
+        bucket["sample_count"] += 1
+        for counter, (sum_column, samples_column) in _ROLLUP_COUNTERS.items():
+            if row[counter] is not None:
+                bucket[sum_column] += row[counter]
+                bucket[samples_column] += 1
+        bucket["age_distribution"] = _merge_counts(bucket["age_distribution"], row["age_distribution"])
+        bucket["emotion_distribution"] = _merge_counts(bucket["emotion_distribution"], row["emotion_distribution"])
+
+    existing = (
+        session.query(StreamStatHourly)
+        .filter(
+            StreamStatHourly.stream_name.in_({key[0] for key in buckets}),
+            StreamStatHourly.hour_bucket.in_({key[1] for key in buckets}),
+        )
+        .all()
+    )
+    for stored in existing:
+        bucket = buckets.get((stored.stream_name, stored.hour_bucket))
+        if bucket is not None:
+            bucket["age_distribution"] = _merge_counts(stored.age_distribution, bucket["age_distribution"])
+            bucket["emotion_distribution"] = _merge_counts(stored.emotion_distribution, bucket["emotion_distribution"])
+
+    table = StreamStatHourly.__table__
+    stmt = sqlite_insert(table).values(list(buckets.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.stream_name, table.c.hour_bucket],
+        set_={
+            "sample_count": table.c.sample_count + stmt.excluded.sample_count,
+            "person_count_sum": table.c.person_count_sum + stmt.excluded.person_count_sum,
+            "male_sum": table.c.male_sum + stmt.excluded.male_sum,
+            "female_sum": table.c.female_sum + stmt.excluded.female_sum,
+            "person_count_samples": table.c.person_count_samples + stmt.excluded.person_count_samples,
+            "male_samples": table.c.male_samples + stmt.excluded.male_samples,
+            "female_samples": table.c.female_samples + stmt.excluded.female_samples,
+            "age_distribution": stmt.excluded.age_distribution,
+            "emotion_distribution": stmt.excluded.emotion_distribution,
+        },
+    )
+    session.execute(stmt)
+
+
+def _configure_sqlite(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _backfill_rollup(session_factory, chunk_size: int = 5000) -> None:
+    """Build ``StreamStatHourly`` from existing stat rows when the rollup is still empty."""
+
+    session = session_factory()
+    try:
+        if session.query(StreamStatHourly.id).first() is not None:
+            return
+        if session.query(StreamStat.id).first() is None:
+            return
+        columns = (
+            "stream_name",
+            "captured_at",
+            "person_count",
+            "male_count",
+            "female_count",
+            "age_distribution",
+            "emotion_distribution",
+        )
+        query = session.query(*(getattr(StreamStat, name) for name in columns)).order_by(StreamStat.id)
+        total = 0
+        chunk: List[dict] = []
+        for row in query.yield_per(chunk_size):
+            chunk.append(dict(zip(columns, row)))
+            if len(chunk) >= chunk_size:
+                _rollup_stats(session, chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            _rollup_stats(session, chunk)
+            total += len(chunk)
+        session.commit()
+        LOGGER.info("Backfilled hourly rollup from %d stat rows", total)
+    finally:
+        session.close()
 
 
 def create_storage(cfg: StorageConfig):
     Path(cfg.sqlite_path).parent.mkdir(parents=True, exist_ok=True)
-    engine = create_engine(f"sqlite:///{cfg.sqlite_path}")
+    engine = create_engine(f"sqlite:///{cfg.sqlite_path}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _configure_sqlite)
     if cfg.recreate:
         Base.metadata.drop_all(engine)
+    rollup = StreamStatHourly.__table__
+    if inspect(engine).has_table(rollup.name):
+        known = {column["name"] for column in inspect(engine).get_columns(rollup.name)}
+        if not set(rollup.columns.keys()) <= known:
+            # The rollup is derived data; rebuild it from stream_stats below.
+            LOGGER.info("Rebuilding %s for the new schema", rollup.name)
+            rollup.drop(engine)
     Base.metadata.create_all(engine)
+    # create_all skips existing tables, so add indexes introduced since they were created.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        for name in _REDUNDANT_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
     Session = sessionmaker(bind=engine)
+    _backfill_rollup(Session)
     LOGGER.info("Connected to SQLite at %s", cfg.sqlite_path)
     return Session
 
 
+class StorageWriter(threading.Thread):
+    """Write-behind queue that inserts rows in bulk from a single thread.
+
+    Rows are collected until ``batch_size`` rows are pending or
+    ``flush_interval`` seconds have passed since the first one, then inserted
+    with one executemany per table and a single commit. Stat rows are folded
+    into the hourly rollup in the same transaction.
+    """
+
+    def __init__(self, session_factory, batch_size: int = 100, flush_interval: float = 0.5) -> None:
+        super().__init__(daemon=True, name="storage-writer")
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: Queue[Tuple[Type[Base], dict]] = Queue()
+        self.stop_event = threading.Event()
+
+    def put(self, model: Type[Base], row: dict) -> None:
+        self.queue.put_nowait((model, row))
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(timeout=timeout)
+
+    def run(self) -> None:
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            try:
+                pending = [self.queue.get(timeout=self.flush_interval)]
+            except Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self.queue.get(timeout=remaining))
+                except Empty:
+                    break
+            try:
+                self.flush(pending)
+            except Exception as exc:  # pragma: no cover - keep the writer alive
+                LOGGER.exception("Failed to write %d rows: %s", len(pending), exc)
+        LOGGER.info("Storage writer stopped")
+
+    def flush(self, pending: List[Tuple[Type[Base], dict]]) -> None:
+        rows: Dict[Type[Base], List[dict]] = {}
+        for model, row in pending:
+            rows.setdefault(model, []).append(row)
+        session = self.session_factory()
+        try:
+            for model, model_rows in rows.items():
+                session.execute(insert(model), model_rows)
+            if StreamStat in rows:
+                _rollup_stats(session, rows[StreamStat])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
 def record_stat(
-    session_factory,
+    writer: StorageWriter,
     stream_name: str,
     person_count: Optional[int],
     male_count: Optional[int],
@@ -64,42 +316,40 @@ def record_stat(
     emotion_distribution: Optional[dict],
     notes: Optional[str] = None,
 ) -> None:
-    session = session_factory()
-    try:
-        stat = StreamStat(
-            stream_name=stream_name,
-            person_count=person_count,
-            male_count=male_count,
-            female_count=female_count,
-            age_distribution=age_distribution,
-            emotion_distribution=emotion_distribution,
-            notes=notes,
-        )
-        session.add(stat)
-        session.commit()
-    finally:
-        session.close()
+    writer.put(
+        StreamStat,
+        {
+            "stream_name": stream_name,
+            "captured_at": dt.datetime.utcnow(),
+            "person_count": person_count,
+            "male_count": male_count,
+            "female_count": female_count,
+            "age_distribution": age_distribution,
+            "emotion_distribution": emotion_distribution,
+            "notes": notes,
+        },
+    )
 
 
-def record_alert(session_factory, stream_name: str, event_type: str, confidence: float, message: str) -> None:
-    session = session_factory()
-    try:
-        entry = AlertLog(
-            stream_name=stream_name,
-            event_type=event_type,
-            confidence=confidence,
-            message=message,
-        )
-        session.add(entry)
-        session.commit()
-    finally:
-        session.close()
+def record_alert(writer: StorageWriter, stream_name: str, event_type: str, confidence: float, message: str) -> None:
+    writer.put(
+        AlertLog,
+        {
+            "stream_name": stream_name,
+            "event_type": event_type,
+            "confidence": confidence,
+            "message": message,
+            "created_at": dt.datetime.utcnow(),
+        },
+    )
 
 
 __all__ = [
     "create_storage",
+    "StorageWriter",
     "record_stat",
     "record_alert",
     "StreamStat",
+    "StreamStatHourly",
     "AlertLog",
 ]
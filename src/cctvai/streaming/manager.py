@@ -1,43 +1,155 @@
-"""Video stream manager."""
+"""Video stream manager.
+
+Each stream is decoded in its own process so capture and letterboxing run in
+parallel with the pipeline instead of contending for the GIL. Decoded frames are
+written into a per-stream shared memory ring; only small metadata dicts travel
+through the multiprocessing queue and the main process wraps the ring slots as
+zero-copy arrays.
+"""
 from __future__ import annotations
 
 import logging
-import threading
+import multiprocessing as mp
+import signal
 import time
-from dataclasses import dataclass
-from queue import Queue
-from typing import Callable, Dict, Iterable, Iterator, Optional
+from dataclasses import dataclass, field
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import cv2
 import numpy as np
 
 from ..config import StreamConfig
+from ..imaging import letterbox
 
 LOGGER = logging.getLogger(__name__)
 
+FRAME_SLOTS = 16
+_CONTEXT = mp.get_context("spawn")
+
 
 @dataclass
 class Frame:
+    """A decoded frame.
+
+    ``data`` is letterboxed to the stream's ``detect_size`` when one is set;
+    ``orig_shape`` is the (height, width) of the decoded frame and ``data_full``
+    keeps the decoded frame itself when the manager was asked to.
+    """
+
     stream: StreamConfig
     frame_id: int
     data: np.ndarray
     timestamp: float
+    orig_shape: Optional[Tuple[int, int]] = None
+    data_full: Optional[np.ndarray] = None
+    _release: Optional[Callable[[], None]] = field(default=None, repr=False, compare=False)
+
+    @property
+    def original(self) -> np.ndarray:
+        """The frame in original resolution, falling back to ``data``."""
+
+        return self.data_full if self.data_full is not None else self.data
+
+    def release(self) -> None:
+        """Hand the shared memory slot back to the stream worker.
+
+        The arrays of the frame must not be used afterwards.
+        """
+
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+
+class SharedFrameRing:
+    """Fixed number of frame slots backed by one shared memory segment.
+
+    Each slot holds the (letterboxed) frame and, optionally, the decoded
+    full-resolution frame behind it.
+    """
+
+    def __init__(
+        self,
+        slots: int,
+        data_shape: Tuple[int, ...],
+        full_shape: Optional[Tuple[int, ...]] = None,
+        name: Optional[str] = None,
+    ) -> None:
+        self.slots = slots
+        self.data_shape = tuple(data_shape)
+        self.full_shape = tuple(full_shape) if full_shape else None
+        data_bytes = slots * int(np.prod(self.data_shape))
+        full_bytes = slots * int(np.prod(self.full_shape)) if self.full_shape else 0
+        if name is None:
+            self.shm = SharedMemory(create=True, size=data_bytes + full_bytes)
+        else:
+            self.shm = SharedMemory(name=name)
+        self.data = np.ndarray((slots, *self.data_shape), dtype=np.uint8, buffer=self.shm.buf)
+        self.full = (
+            np.ndarray((slots, *self.full_shape), dtype=np.uint8, buffer=self.shm.buf, offset=data_bytes)
+            if self.full_shape
+            else None
+        )
+
+    @classmethod
+    def attach(cls, spec: dict) -> "SharedFrameRing":
+        return cls(spec["slots"], spec["data_shape"], spec["full_shape"], name=spec["name"])
+
+    def spec(self) -> dict:
+        return {
+            "name": self.shm.name,
+            "slots": self.slots,
+            "data_shape": self.data_shape,
+            "full_shape": self.full_shape,
+        }
+
+    def fits(self, data_shape: Tuple[int, ...], full_shape: Optional[Tuple[int, ...]]) -> bool:
+        return self.data_shape == tuple(data_shape) and self.full_shape == (tuple(full_shape) if full_shape else None)
 
+    def close(self, unlink: bool = False) -> None:
+        self.data = self.full = None
+        try:
+            self.shm.close()
+        except BufferError:  # pragma: no cover - frames still hold views
+            LOGGER.debug("Shared memory %s still referenced", self.shm.name)
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:  # pragma: no cover
+                pass
 
-class StreamWorker(threading.Thread):
-    """Read frames from a stream and push to queue."""
+
+class StreamWorker(_CONTEXT.Process):
+    """Read frames from a stream in a separate process.
+
+    Frames are written into a ``SharedFrameRing`` and announced on ``queue`` as
+    metadata dicts. ``free_slots`` is a queue of slot indices the main process
+    has handed back; a slot is only written after its index was returned, so
+    frames may be released in any order.
+    """
 
     def __init__(
         self,
         stream: StreamConfig,
-        queue: Queue,
-        stop_event: threading.Event,
+        index: int,
+        queue,
+        stop_event,
+        free_slots,
+        keep_full_frames: bool = False,
     ) -> None:
         super().__init__(daemon=True, name=f"stream-{stream.name}")
         self.stream = stream
+        self.index = index
         self.queue = queue
         self.stop_event = stop_event
-        self._capture: Optional[cv2.VideoCapture] = None
+        self.free_slots = free_slots
+        self.keep_full_frames = keep_full_frames
+        self.use_opencl = stream.use_gpu_preproc and cv2.ocl.haveOpenCL()
+        if stream.use_gpu_preproc and not self.use_opencl:
+            LOGGER.warning("OpenCL is not available; stream %s preprocesses on the CPU", stream.name)
 
     def open_capture(self) -> cv2.VideoCapture:
         source = int(self.stream.url) if self.stream.url.isdigit() else self.stream.url
@@ -47,38 +159,92 @@ class StreamWorker(threading.Thread):
         LOGGER.info("Opened stream %s", self.stream.name)
         return capture
 
-    def run(self) -> None:
-        frame_id = 0
-        self._capture = self.open_capture()
+    def preprocess(self, image: np.ndarray) -> np.ndarray:
+        detect_size = self.stream.detect_size
+        return letterbox(image, tuple(detect_size), use_opencl=self.use_opencl) if detect_size else image
+
+    def _acquire_slot(self) -> Optional[int]:
         while not self.stop_event.is_set():
-            ok, frame = self._capture.read()
-            if not ok:
-                LOGGER.warning("Stream %s ended", self.stream.name)
-                break
-            frame_id += 1
-            if frame_id % self.stream.sampling_rate != 0:
+            try:
+                return self.free_slots.get(timeout=0.5)
+            except Empty:
                 continue
-            self.queue.put(
-                Frame(
-                    stream=self.stream,
-                    frame_id=frame_id,
-                    data=frame,
-                    timestamp=time.time(),
+        return None
+
+    def run(self) -> None:
+        # Only the parent coordinates shutdown, through ``stop_event``; Ctrl-C in
+        # the terminal reaches the whole process group.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        frame_id = 0
+        ring: Optional[SharedFrameRing] = None
+        capture = self.open_capture()
+        try:
+            while not self.stop_event.is_set():
+                ok, image = capture.read()
+                if not ok:
+                    LOGGER.warning("Stream %s ended", self.stream.name)
+                    break
+                frame_id += 1
+                if frame_id % self.stream.sampling_rate != 0:
+                    continue
+                data = self.preprocess(image)
+                full = image if self.keep_full_frames and data is not image else None
+                full_shape = full.shape if full is not None else None
+                if ring is None or not ring.fits(data.shape, full_shape):
+                    # Frames still in flight keep the old segment alive; the main
+                    # process unlinks every segment it has seen on stop.
+                    if ring is not None:
+                        ring.close()
+                    ring = SharedFrameRing(FRAME_SLOTS, data.shape, full_shape)
+                slot = self._acquire_slot()
+                if slot is None:
+                    break
+                ring.data[slot] = data
+                if full is not None:
+                    ring.full[slot] = full
+                self.queue.put(
+                    {
+                        "stream": self.index,
+                        "frame_id": frame_id,
+                        "timestamp": time.time(),
+                        "orig_shape": image.shape[:2],
+                        "ring": ring.spec(),
+                        "slot": slot,
+                    }
                 )
-            )
-        if self._capture is not None:
-            self._capture.release()
+        finally:
+            capture.release()
+            if ring is not None:
+                ring.close()
+            if self.stop_event.is_set():
+                # Do not block process exit on frames nobody will read any more.
+                self.queue.cancel_join_thread()
         LOGGER.info("Stream worker %s stopped", self.stream.name)
 
 
 class StreamManager:
-    """Manage multiple stream workers."""
+    """Manage multiple stream worker processes."""
 
-    def __init__(self, streams: Iterable[StreamConfig]) -> None:
+    def __init__(self, streams: Iterable[StreamConfig], keep_full_frames: bool = False) -> None:
         self.streams = [s for s in streams if s.enabled]
-        self.queue: Queue[Frame] = Queue(maxsize=32)
-        self.stop_event = threading.Event()
-        self.workers = [StreamWorker(stream=s, queue=self.queue, stop_event=self.stop_event) for s in self.streams]
+        self.queue = _CONTEXT.Queue(maxsize=32)
+        self.stop_event = _CONTEXT.Event()
+        self._free_slots = [_CONTEXT.Queue() for _ in self.streams]
+        for free_slots in self._free_slots:
+            for slot in range(FRAME_SLOTS):
+                free_slots.put(slot)
+        self._rings: Dict[str, SharedFrameRing] = {}
+        self.workers = [
+            StreamWorker(
+                stream=s,
+                index=index,
+                queue=self.queue,
+                stop_event=self.stop_event,
+                free_slots=self._free_slots[index],
+                keep_full_frames=keep_full_frames,
+            )
+            for index, s in enumerate(self.streams)
+        ]
 
     def start(self) -> None:
         for worker in self.workers:
@@ -89,12 +255,76 @@ class StreamManager:
         self.stop_event.set()
         for worker in self.workers:
             worker.join(timeout=2)
+            if worker.is_alive():
+                worker.terminate()
+        for ring in self._rings.values():
+            ring.close(unlink=True)
+        self._rings.clear()
         LOGGER.info("All stream workers stopped")
 
+    def _to_frame(self, message: dict) -> Frame:
+        spec = message["ring"]
+        ring = self._rings.get(spec["name"])
+        if ring is None:
+            ring = self._rings[spec["name"]] = SharedFrameRing.attach(spec)
+        slot = message["slot"]
+        return Frame(
+            stream=self.streams[message["stream"]],
+            frame_id=message["frame_id"],
+            data=ring.data[slot],
+            timestamp=message["timestamp"],
+            orig_shape=message["orig_shape"],
+            data_full=ring.full[slot] if ring.full is not None else None,
+            _release=partial(self._free_slots[message["stream"]].put, slot),
+        )
+
+    def _get(self, timeout: float) -> Optional[Frame]:
+        """Return the next frame, or ``None`` if its message could not be attached."""
+
+        message = self.queue.get(timeout=timeout)
+        try:
+            return self._to_frame(message)
+        except Exception as exc:  # pragma: no cover - keep the consumer alive
+            LOGGER.exception("Dropping frame %s of stream %s: %s", message["frame_id"], message["stream"], exc)
+            self._free_slots[message["stream"]].put(message["slot"])
+            return None
+
     def frames(self) -> Iterator[Frame]:
         while not self.stop_event.is_set():
-            frame = self.queue.get()
-            yield frame
+            try:
+                frame = self._get(timeout=0.5)
+            except Empty:
+                continue
+            if frame is not None:
+                yield frame
+
+    def batches(self, max_size: int, window: float) -> Iterator[List[Frame]]:
+        """Yield micro-batches of up to ``max_size`` frames.
+
+        Waits for the first frame, then keeps collecting queued frames until the
+        batch is full or ``window`` seconds have passed. Consumers must call
+        ``Frame.release`` once they are done with each frame.
+        """
+
+        while not self.stop_event.is_set():
+            try:
+                first = self._get(timeout=0.5)
+            except Empty:
+                continue
+            batch = [first] if first is not None else []
+            deadline = time.monotonic() + window
+            while len(batch) < max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    frame = self._get(timeout=remaining)
+                except Empty:
+                    break
+                if frame is not None:
+                    batch.append(frame)
+            if batch:
+                yield batch
 
 
-__all__ = ["StreamManager", "Frame"]
+__all__ = ["StreamManager", "Frame", "SharedFrameRing"]
@@ -13,12 +13,19 @@ from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 
 from ..config import CCTVAIConfig
-from ..storage import AlertLog, StreamStat
+from ..storage import AlertLog, StreamStat, StreamStatHourly
 
 LOGGER = logging.getLogger(__name__)
 
 
 DASHBOARD_HTML = Path(__file__).with_name("dashboard.html")
+HOURLY_ROLLUP_SECONDS = 3600
+
+
+def _average(total: int, samples: int) -> Optional[float]:
+    """Mean over the samples in which a counter was known, ``None`` if it never was."""
+
+    return round(total / samples, 2) if samples else None
 
 
 def create_app(config: CCTVAIConfig, session_factory) -> FastAPI:
@@ -65,13 +72,15 @@ def create_app(config: CCTVAIConfig, session_factory) -> FastAPI:
     async def list_stats(limit: int = 50):
         session = session_factory()
         try:
-            stats = (
-                session.query(StreamStat)
-                .order_by(StreamStat.captured_at.desc())
-                .limit(limit)
-                .all()
-            )
-            return [
+            # Long time spans come from the hourly rollup for completed hours; the
+            # current hour is still served from the raw rows.
+            rollup = limit * config.analytics.aggregation_interval_seconds >= HOURLY_ROLLUP_SECONDS
+            current_hour = dt.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+            query = session.query(StreamStat)
+            if rollup:
+                query = query.filter(StreamStat.captured_at >= current_hour)
+            stats = query.order_by(StreamStat.captured_at.desc()).limit(limit).all()
+            rows = [
                 {
                     "stream_name": s.stream_name,
                     "captured_at": s.captured_at.isoformat(),
@@ -80,12 +89,41 @@ def create_app(config: CCTVAIConfig, session_factory) -> FastAPI:
                     "female_count": s.female_count,
                     "age_distribution": s.age_distribution,
                     "emotion_distribution": s.emotion_distribution,
+                    "granularity": "sample",
                 }
                 for s in stats
             ]
+            if rollup and len(rows) < limit:
+                rows.extend(list_hourly_stats(session, current_hour, limit - len(rows)))
+            return rows
         finally:
             session.close()
 
+    def list_hourly_stats(session, before: dt.datetime, limit: int):
+        """Rollup rows older than ``before``, with counts averaged per known sample."""
+
+        stats = (
+            session.query(StreamStatHourly)
+            .filter(StreamStatHourly.hour_bucket < before)
+            .order_by(StreamStatHourly.hour_bucket.desc())
+            .limit(limit)
+            .all()
+        )
+        return [
+            {
+                "stream_name": s.stream_name,
+                "captured_at": s.hour_bucket.isoformat(),
+                "person_count": _average(s.person_count_sum, s.person_count_samples),
+                "male_count": _average(s.male_sum, s.male_samples),
+                "female_count": _average(s.female_sum, s.female_samples),
+                "age_distribution": s.age_distribution,
+                "emotion_distribution": s.emotion_distribution,
+                "sample_count": s.sample_count,
+                "granularity": "hour",
+            }
+            for s in stats
+        ]
+
     return app
 
 
@@ -0,0 +1,148 @@
+"""Pipeline stage workers.
+
+The pipeline is split into detect and analytics stages that run on their own
+threads and hand work over through bounded queues; persistence is handled by
+``storage.StorageWriter``. The heavy lifting happens inside OpenCV/PyTorch/SQLite
+which release the GIL, so the stages overlap instead of serialising on the main
+thread.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+from queue import Empty, Queue
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .detectors.base import Detection, PersonDetector
+from .streaming.manager import Frame, StreamManager
+
+LOGGER = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5
+
+FrameDetections = Tuple[Frame, List[Detection]]
+
+
+class StageWorker(threading.Thread, ABC):
+    """Run one pipeline stage on a daemon thread until stopped."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(daemon=True, name=name)
+        self.stop_event = threading.Event()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the stage to finish and wait for it; without ``timeout`` until it has drained."""
+
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(timeout=timeout)
+
+    def run(self) -> None:
+        try:
+            self.process()
+        finally:
+            self.close()
+            LOGGER.info("%s stopped", self.name)
+
+    @abstractmethod
+    def process(self) -> None:
+        """Do the stage's work until ``stop_event`` is set."""
+
+    def close(self) -> None:
+        """Release resources once the stage has finished."""
+
+
+class DetectWorker(StageWorker):
+    """Pull frame batches from the stream manager and run person detection."""
+
+    def __init__(
+        self,
+        stream_manager: StreamManager,
+        detector: PersonDetector,
+        outbox: Queue,
+        batch_size: int,
+        batch_window: float,
+    ) -> None:
+        super().__init__(name="detect")
+        self.stream_manager = stream_manager
+        self.detector = detector
+        self.outbox = outbox
+        self.batch_size = max(batch_size, 1)
+        self.batch_window = batch_window
+
+    def process(self) -> None:
+        for batch in self.stream_manager.batches(self.batch_size, self.batch_window):
+            if self.stop_event.is_set():
+                for frame in batch:
+                    frame.release()
+                break
+            try:
+                detections = self.detector.detect_batch(
+                    [frame.data for frame in batch], [frame.orig_shape for frame in batch]
+                )
+                self.outbox.put(list(zip(batch, detections)))
+            except Exception as exc:  # pragma: no cover - keep the stage alive
+                LOGGER.exception("Person detection failed: %s", exc)
+                for frame in batch:
+                    frame.release()
+
+
+class AnalyticsWorker(StageWorker):
+    """Run per-frame analytics, processing different streams in parallel.
+
+    Frames of the same stream are handled in order by a single task so that
+    per-stream state (behaviour windows, stat timers) is never shared between
+    threads. Each frame is released back to its stream once handled; the inbox
+    is drained before the stage stops.
+    """
+
+    def __init__(
+        self,
+        inbox: Queue,
+        handler: Callable[[Frame, List[Detection]], None],
+        max_workers: int,
+    ) -> None:
+        super().__init__(name="analytics")
+        self.inbox = inbox
+        self.handler = handler
+        self._executor = ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix="analytics")
+
+    def process(self) -> None:
+        while True:
+            try:
+                item = self.inbox.get(timeout=POLL_INTERVAL)
+            except Empty:
+                if self.stop_event.is_set():
+                    break
+                continue
+            try:
+                self.handle(item)
+            except Exception as exc:  # pragma: no cover - keep the stage alive
+                LOGGER.exception("%s failed: %s", self.name, exc)
+
+    def handle(self, item: List[FrameDetections]) -> None:
+        per_stream: Dict[str, List[FrameDetections]] = {}
+        for frame, detections in item:
+            per_stream.setdefault(frame.stream.name, []).append((frame, detections))
+        futures = [self._executor.submit(self._run_stream, entries) for entries in per_stream.values()]
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    def _run_stream(self, entries: List[FrameDetections]) -> None:
+        for index, (frame, detections) in enumerate(entries):
+            try:
+                self.handler(frame, detections)
+            except Exception:
+                for pending, _ in entries[index:]:
+                    pending.release()
+                raise
+            frame.release()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+__all__ = ["StageWorker", "DetectWorker", "AnalyticsWorker"]